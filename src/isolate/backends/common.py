@@ -71,10 +71,17 @@ def _try_acquire(lock_file: Path) -> bool:
         return True
 
 
+@lru_cache(maxsize=256)
 def get_executable_path(search_path: Path, executable_name: str) -> Path:
     """Return the path for the executable named 'executable_name' under
     the '/bin' directory of 'search_path'."""
 
+    # The location of the executable is already known, so try it directly
+    # before falling back to a full search (e.g. for resolving PATHEXT).
+    candidate = search_path / "bin" / executable_name
+    if candidate.is_file() and os.access(candidate, os.X_OK):
+        return candidate
+
     bin_dir = (search_path / "bin").as_posix()
     executable_path = shutil.which(executable_name, path=bin_dir)
     if executable_path is None:
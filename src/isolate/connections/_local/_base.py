@@ -5,7 +5,7 @@ import subprocess
 import sysconfig
 from contextlib import contextmanager
 from dataclasses import dataclass, field
-from functools import partial
+from functools import lru_cache, partial
 from pathlib import Path
 from typing import (
     TYPE_CHECKING,
@@ -26,6 +26,28 @@ if TYPE_CHECKING:
 ConnectionType = TypeVar("ConnectionType")
 
 
+# The sysconfig schemes don't change during the lifetime of the process, so the
+# expanded paths only depend on the environment's base directory. These are cached
+# since they are re-computed every time an agent process is spawned.
+@lru_cache(maxsize=256)
+def _scripts_path_for(search_path: Path) -> str:
+    return sysconfig.get_path("scripts", vars={"base": search_path})
+
+
+@lru_cache(maxsize=256)
+def _purelib_glob_for(search_path: Path) -> str:
+    raw_glob_expr = sysconfig.get_path(
+        "purelib",
+        vars={
+            "base": search_path,
+            "python_version": "*",
+            "py_version_short": "*",
+            "py_version_nodot": "*",
+        },
+    )
+    return Path(raw_glob_expr).relative_to(search_path).as_posix()
+
+
 def binary_path_for(*search_paths: Path) -> str:
     """Return the binary search path for the given 'search_paths'.
     It will be a combination of the 'bin/' folders in them and
@@ -33,7 +55,7 @@ def binary_path_for(*search_paths: Path) -> str:
 
     paths = []
     for search_path in search_paths:
-        path = sysconfig.get_path("scripts", vars={"base": search_path})
+        path = _scripts_path_for(search_path)
         paths.append(path)
         # Some distributions (conda) might include both a 'bin' and
         # a 'scripts' folder.
@@ -60,16 +82,7 @@ def python_path_for(*search_paths: Path) -> str:
         #
         # Be aware that Debian's system installation does not
         # comform sysconfig.
-        raw_glob_expr = sysconfig.get_path(
-            "purelib",
-            vars={
-                "base": search_path,
-                "python_version": "*",
-                "py_version_short": "*",
-                "py_version_nodot": "*",
-            },
-        )
-        relative_glob_expr = Path(raw_glob_expr).relative_to(search_path).as_posix()
+        relative_glob_expr = _purelib_glob_for(search_path)
 
         # Try to find expand the Python version in the path. This is
         # necessary for supporting multiple Python versions in the same
@@ -8,13 +8,16 @@ from typing import TYPE_CHECKING, Any, Iterator, cast
 
 from tblib import Traceback, TracebackParseError
 
+from isolate.connections.ipc.agent import PICKLE_COMPATIBLE_BACKENDS, PICKLE_PROTOCOL
+
 if TYPE_CHECKING:
     from typing import Protocol
 
     class SerializationBackend(Protocol):
         def loads(self, data: bytes) -> Any: ...
 
-        def dumps(self, obj: Any) -> bytes: ...
+        # Pickle-compatible backends also take the protocol as a keyword.
+        def dumps(self, obj: Any, **kwargs: Any) -> bytes: ...
 
 
 AGENT_SIGNATURE = "IS_ISOLATE_AGENT"
@@ -90,6 +93,8 @@ def serialize_object(serialization_method: str, object: Any) -> bytes:
         )
 
     with _step("serializing the given object"):
+        if serialization_method in PICKLE_COMPATIBLE_BACKENDS:
+            return serialization_backend.dumps(object, protocol=PICKLE_PROTOCOL)
         return serialization_backend.dumps(object)
 
 
@@ -1,8 +1,9 @@
 import socket
+import subprocess
 from contextlib import contextmanager
 from dataclasses import dataclass
 from pathlib import Path
-from typing import Any, ContextManager, Iterator, List, Tuple, Union, cast
+from typing import Any, ContextManager, Iterator, List, Optional, Tuple, Union, cast
 
 import grpc
 
@@ -113,6 +114,9 @@ class GRPCExecutionBase(EnvironmentConnection):
 
 
 class LocalPythonGRPC(PythonExecutionBase[str], GRPCExecutionBase):
+    # The agent process that is currently running (if there is any).
+    _agent_process: Optional[subprocess.Popen] = None
+
     @contextmanager
     def start_agent(self) -> Iterator[Tuple[str, grpc.ChannelCredentials]]:
         def find_free_port() -> Tuple[str, int]:
@@ -126,6 +130,7 @@ class LocalPythonGRPC(PythonExecutionBase[str], GRPCExecutionBase):
         process = None
         try:
             with self.start_process(address) as process:
+                self._agent_process = process
                 yield address, grpc.local_channel_credentials()
         finally:
             if process is not None:
@@ -11,7 +11,9 @@ but then runs it in the context of the frozen agent built environment.
 from __future__ import annotations
 
 import os
+import select
 import sys
+import time
 import traceback
 from argparse import ArgumentParser
 from concurrent import futures
@@ -35,6 +37,12 @@ from isolate.connections.common import SerializationError, serialize_object
 from isolate.connections.grpc import definitions
 from isolate.connections.grpc.configuration import get_default_options
 from isolate.connections.grpc.interface import from_grpc
+from isolate.connections.ipc.agent import _get_stack_depth
+
+# For how long (in seconds) a failed setup function is remembered. Setup
+# functions are expected to be idempotent, so a retry within this window
+# fails immediately instead of executing the setup function again.
+SETUP_FAILURE_CACHE_TTL = float(os.getenv("ISOLATE_SETUP_FAILURE_CACHE_TTL", "10"))
 
 
 @dataclass
@@ -47,7 +55,8 @@ class AgentServicer(definitions.AgentServicer):
         super().__init__()
 
         self._run_cache: dict[str, Any] = {}
-        self._log = sys.stdout if log_fd is None else os.fdopen(log_fd, "w")
+        self._setup_failures: dict[str, tuple[float, definitions.PartialRunResult]] = {}
+        self._log_fd = sys.stdout.fileno() if log_fd is None else log_fd
 
     def Run(
         self,
@@ -60,12 +69,23 @@ class AgentServicer(definitions.AgentServicer):
 
         extra_args = []
         if request.HasField("setup_func"):
-            cache_key = sha256_digest_of(
+            # Callers can pre-compute the cache key (so that we don't have
+            # to hash the same definition over and over again).
+            cache_key = request.setup_func.cache_key or sha256_digest_of(
                 request.setup_func.definition,
                 request.setup_func.method,
             )
             if cache_key not in self._run_cache:
                 try:
+                    setup_failure = self._get_setup_failure(cache_key)
+                    if setup_failure is not None:
+                        self.log(
+                            "The setup function has recently thrown an error. "
+                            "Aborting the run."
+                        )
+                        yield setup_failure
+                        raise AbortException("The setup function has thrown an error.")
+
                     (
                         result,
                         was_it_raised,
@@ -79,12 +99,14 @@ class AgentServicer(definitions.AgentServicer):
                         self.log(
                             "The setup function has thrown an error. Aborting the run."
                         )
-                        yield self.send_object(
+                        setup_failure = self.send_object(
                             request.setup_func.method,
                             result,
                             was_it_raised,
                             stringized_tb,
                         )
+                        self._remember_setup_failure(cache_key, setup_failure)
+                        yield setup_failure
                         raise AbortException("The setup function has thrown an error.")
                 except AbortException as exc:
                     return self.abort_with_msg(context, exc.message)
@@ -109,6 +131,43 @@ class AgentServicer(definitions.AgentServicer):
         except AbortException as exc:
             return self.abort_with_msg(context, exc.message)
 
+    def _remember_setup_failure(
+        self,
+        cache_key: str,
+        setup_failure: definitions.PartialRunResult,
+    ) -> None:
+        """Remember the failure of the setup function with the given cache key,
+        and forget the ones that have already expired (so that a long-lived
+        agent doesn't keep one entry for every setup function it has seen)."""
+        now = time.monotonic()
+
+        # Failures are inserted in chronological order, so the expired ones
+        # are always at the beginning.
+        while self._setup_failures:
+            oldest_key = next(iter(self._setup_failures))
+            failed_at, _ = self._setup_failures[oldest_key]
+            if now - failed_at <= SETUP_FAILURE_CACHE_TTL:
+                break
+            del self._setup_failures[oldest_key]
+
+        self._setup_failures[cache_key] = (now, setup_failure)
+
+    def _get_setup_failure(
+        self,
+        cache_key: str,
+    ) -> definitions.PartialRunResult | None:
+        """Return the result of the setup function with the given cache key,
+        if it has thrown an error in the last SETUP_FAILURE_CACHE_TTL seconds."""
+        if cache_key not in self._setup_failures:
+            return None
+
+        failed_at, setup_failure = self._setup_failures[cache_key]
+        if time.monotonic() - failed_at > SETUP_FAILURE_CACHE_TTL:
+            del self._setup_failures[cache_key]
+            return None
+
+        return setup_failure
+
     def execute_function(
         self,
         function: definitions.SerializedObject,
@@ -147,7 +206,7 @@ class AgentServicer(definitions.AgentServicer):
         except BaseException as exc:
             result = exc
             was_it_raised = True
-            num_frames = len(traceback.extract_stack()[:-5])
+            num_frames = max(_get_stack_depth() - 5, 0)
             stringized_tb = "".join(traceback.format_exc(limit=-num_frames))
 
         self.log(f"Completed the execution of the {function_kind} function.")
@@ -190,8 +249,18 @@ class AgentServicer(definitions.AgentServicer):
         )
 
     def log(self, message: str) -> None:
-        self._log.write(message + "\n")
-        self._log.flush()
+        # Write directly to the file descriptor (instead of going through a
+        # buffered text stream that needs to be flushed after every line).
+        data = memoryview((message + "\n").encode("utf-8", "backslashreplace"))
+        while data:
+            try:
+                written = os.write(self._log_fd, data)
+            except BlockingIOError:
+                # The log pipe is non-blocking, so wait until the controller
+                # drains it.
+                select.select([], [self._log_fd], [])
+                continue
+            data = data[written:]
 
     def abort_with_msg(
         self,
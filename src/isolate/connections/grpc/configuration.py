@@ -1,8 +1,45 @@
 import ast
 import os
 
+import grpc
+
 _GRPC_OPTION_PREFIX = "ISOLATE_GRPC_CALL_"
 
+# Defaults for the isolate server, where Run streams might stay open (and silent)
+# for a long time. The server pings its clients to keep these connections alive
+# (and to detect the dead ones), and it allows clients to do the same.
+_SERVER_DEFAULT_OPTIONS = {
+    "grpc.keepalive_time_ms": 30_000,
+    "grpc.keepalive_timeout_ms": 10_000,
+    "grpc.keepalive_permit_without_calls": 1,
+    "grpc.http2.max_pings_without_data": 0,
+    "grpc.http2.min_recv_ping_interval_without_data_ms": 10_000,
+}
+
+_COMPRESSION_ALGORITHMS = {
+    "none": grpc.Compression.NoCompression,
+    "deflate": grpc.Compression.Deflate,
+    "gzip": grpc.Compression.Gzip,
+}
+
+
+def get_compression_algorithm():
+    """Return the compression algorithm set via the `ISOLATE_GRPC_COMPRESSION`
+    environment variable (one of `none`, `deflate` or `gzip`), or None if it
+    is not set."""
+
+    raw_value = os.getenv("ISOLATE_GRPC_COMPRESSION")
+    if not raw_value:
+        return None
+
+    try:
+        return _COMPRESSION_ALGORITHMS[raw_value.lower()]
+    except KeyError:
+        raise ValueError(
+            f"Unknown gRPC compression algorithm: {raw_value!r} "
+            f"(expected one of {', '.join(_COMPRESSION_ALGORITHMS)})"
+        ) from None
+
 
 def get_default_options():
     """Return the default list of GRPC call options (both for
@@ -21,3 +58,29 @@ def get_default_options():
             value = ast.literal_eval(raw_value)
             options.append((f"grpc.{field}", value))
     return options
+
+
+def get_default_server_options():
+    """Return the default list of GRPC options for the isolate server. These
+    are the options from `get_default_options`, along with the server specific
+    defaults (like keepalive settings) that are not overridden by them.
+
+    If `ISOLATE_GRPC_COMPRESSION` is set, the messages sent by the server will
+    be compressed with the given algorithm by default. This is only applied to
+    the isolate server (and not to the local channels between the server and
+    its agents), since compressing the loopback traffic only costs CPU time.
+    """
+
+    server_defaults = dict(_SERVER_DEFAULT_OPTIONS)
+    compression_algorithm = get_compression_algorithm()
+    if compression_algorithm is not None:
+        server_defaults["grpc.default_compression_algorithm"] = (
+            compression_algorithm.value
+        )
+
+    options = get_default_options()
+    overridden_keys = {key for key, _ in options}
+    for key, value in server_defaults.items():
+        if key not in overridden_keys:
+            options.append((key, value))
+    return options
@@ -69,6 +69,7 @@ class SerializedObject(google.protobuf.message.Message):
     DEFINITION_FIELD_NUMBER: builtins.int
     WAS_IT_RAISED_FIELD_NUMBER: builtins.int
     STRINGIZED_TRACEBACK_FIELD_NUMBER: builtins.int
+    CACHE_KEY_FIELD_NUMBER: builtins.int
     method: builtins.str
     """The serialization method used to serialize the the raw_object. Must be
     present in the environment that is running the agent itself.
@@ -81,6 +82,11 @@ class SerializedObject(google.protobuf.message.Message):
     """
     stringized_traceback: builtins.str
     """The stringized version of the traceback, if it was raised."""
+    cache_key: builtins.str
+    """An optional key that uniquely identifies this object (e.g. the digest
+    of its definition). If set, the agent uses it as the cache key for
+    setup functions instead of hashing the definition on every run.
+    """
     def __init__(
         self,
         *,
@@ -88,9 +94,13 @@ class SerializedObject(google.protobuf.message.Message):
         definition: builtins.bytes = ...,
         was_it_raised: builtins.bool = ...,
         stringized_traceback: builtins.str | None = ...,
+        cache_key: builtins.str | None = ...,
     ) -> None: ...
-    def HasField(self, field_name: typing_extensions.Literal["_stringized_traceback", b"_stringized_traceback", "stringized_traceback", b"stringized_traceback"]) -> builtins.bool: ...
-    def ClearField(self, field_name: typing_extensions.Literal["_stringized_traceback", b"_stringized_traceback", "definition", b"definition", "method", b"method", "stringized_traceback", b"stringized_traceback", "was_it_raised", b"was_it_raised"]) -> None: ...
+    def HasField(self, field_name: typing_extensions.Literal["_cache_key", b"_cache_key", "_stringized_traceback", b"_stringized_traceback", "cache_key", b"cache_key", "stringized_traceback", b"stringized_traceback"]) -> builtins.bool: ...
+    def ClearField(self, field_name: typing_extensions.Literal["_cache_key", b"_cache_key", "_stringized_traceback", b"_stringized_traceback", "cache_key", b"cache_key", "definition", b"definition", "method", b"method", "stringized_traceback", b"stringized_traceback", "was_it_raised", b"was_it_raised"]) -> None: ...
+    @typing.overload
+    def WhichOneof(self, oneof_group: typing_extensions.Literal["_cache_key", b"_cache_key"]) -> typing_extensions.Literal["cache_key"] | None: ...
+    @typing.overload
     def WhichOneof(self, oneof_group: typing_extensions.Literal["_stringized_traceback", b"_stringized_traceback"]) -> typing_extensions.Literal["stringized_traceback"] | None: ...
 
 global___SerializedObject = SerializedObject
@@ -47,7 +47,9 @@ def _(message: definitions.Log) -> Log:
 
 
 @to_grpc.register
-def _(obj: Log) -> definitions.Log:
+def log_to_grpc(obj: Log) -> definitions.Log:
+    """Convert a log into a gRPC message. Same as to_grpc(log), but it can be
+    called directly (with a precise return type) on the hot paths."""
     return definitions.Log(
         message=obj.message,
         source=definitions.LogSource.Value(obj.source.name.upper()),
@@ -1,19 +1,13 @@
 from __future__ import annotations
 
-import base64
-import importlib
+import os
+import selectors
 import subprocess
-import time
 from contextlib import ExitStack, closing
 from dataclasses import dataclass
 from multiprocessing.connection import Connection, Listener
 from pathlib import Path
-from typing import (
-    TYPE_CHECKING,
-    Any,
-    Callable,
-    ContextManager,
-)
+from typing import Any, ContextManager
 
 from isolate.backends import (
     BasicCallable,
@@ -25,25 +19,9 @@ from isolate.connections.common import prepare_exc
 from isolate.connections.ipc import agent
 from isolate.logs import LogLevel, LogSource
 
-if TYPE_CHECKING:
-    # Somhow mypy can't figure out that `ConnectionWrapper`
-    # really exists.
-    class ConnectionWrapper(Connection):
-        def __init__(
-            self,
-            connection: Any,
-            loads: Callable[[bytes], Any],
-            dumps: Callable[[Any], bytes],
-        ) -> None: ...
-
-        def recv(self) -> Any: ...
-
-        def send(self, value: Any) -> None: ...
-
-        def close(self) -> None: ...
-
-else:
-    from multiprocessing.connection import ConnectionWrapper
+# The agent always runs on the same host as the controller, so we can use UNIX
+# domain sockets (which skip the whole TCP/IP stack) whenever they are available.
+_LISTENER_FAMILY = "AF_UNIX" if os.name == "posix" else "AF_INET"
 
 
 class AgentListener(Listener):
@@ -51,26 +29,24 @@ class AgentListener(Listener):
     to communicate with the child process."""
 
     def __init__(self, backend_name: str, *args: Any, **kwargs: Any) -> None:
-        self.serialization_backend = loadserialization_method(backend_name)
+        # Fail early (before the agent is started) if the backend doesn't exist.
+        agent.serialization_functions(backend_name)
+        self._serialization_method = backend_name
         super().__init__(*args, **kwargs)
 
     def accept(self) -> Connection:
-        return ConnectionWrapper(
-            super().accept(),
-            dumps=self.serialization_backend.dumps,
-            loads=self.serialization_backend.loads,
-        )
-
+        connection = super().accept()
+        agent.set_socket_options(connection)
+        return agent.wrap_connection(connection, self._serialization_method)
 
-def loadserialization_method(backend_name: str) -> Any:
-    # TODO(feat): This should probably throw a better error if the
-    # given backend does not exist.
-    return importlib.import_module(backend_name)
 
+def encode_service_address(address: tuple[str, int] | str) -> str:
+    if isinstance(address, str):
+        # UNIX domain sockets are identified by their path.
+        return address
 
-def encode_service_address(address: tuple[str, int]) -> str:
     host, port = address
-    return base64.b64encode(f"{host}:{port}".encode()).decode("utf-8")
+    return f"{host}:{port}"
 
 
 @dataclass
@@ -82,7 +58,8 @@ class IsolatedProcessConnection(EnvironmentConnection):
     spawn the agent."""
 
     # The amount of seconds to wait before checking whether the
-    # isolated process has exited or not.
+    # isolated process has exited or not (only used when we can't
+    # get notified about the process exit, see _open_process_fd).
     _DEFER_THRESHOLD = 0.25
 
     def start_process(
@@ -123,7 +100,7 @@ class IsolatedProcessConnection(EnvironmentConnection):
             controller_service = stack.enter_context(
                 AgentListener(
                     self.environment.settings.serialization_method,
-                    family="AF_INET",
+                    family=_LISTENER_FAMILY,
                 )
             )
 
@@ -160,22 +137,30 @@ class IsolatedProcessConnection(EnvironmentConnection):
         process: subprocess.Popen,
         connection: Connection,
     ) -> CallResultType:  # type: ignore[type-var]
-        """Take the given process, and poll until either it exits or returns
+        """Take the given process, and wait until either it exits or returns
         a result object."""
 
-        while not connection.poll():
-            # Normally, if we do connection.read() without having this loop
-            # it is going to block us indefinitely (even if the underlying
-            # process has crashed). We can use a combination of process.poll
-            # and connection.poll to check if the process is alive and has data
-            # to move forward.
-            if process.poll():
-                break
-
-            # For preventing busy waiting, we can sleep for a bit
-            # and let other threads run.
-            time.sleep(self._DEFER_THRESHOLD)
-            continue
+        with ExitStack() as stack:
+            # Normally, if we do connection.read() without waiting for any of
+            # these events, it is going to block us indefinitely (even if the
+            # underlying process has crashed). So we wait until either there is
+            # data to read from the connection or the process exits.
+            selector = stack.enter_context(selectors.DefaultSelector())
+            selector.register(connection.fileno(), selectors.EVENT_READ)
+
+            process_fd = _open_process_fd(process)
+            if process_fd is not None:
+                stack.callback(os.close, process_fd)
+                selector.register(process_fd, selectors.EVENT_READ)
+                timeout = None
+            else:
+                timeout = self._DEFER_THRESHOLD
+
+            while not connection.poll():
+                if process.poll() is not None:
+                    break
+
+                selector.select(timeout)
 
         if not connection.poll():
             # If the process has exited but there is still no data, we
@@ -196,6 +181,20 @@ class IsolatedProcessConnection(EnvironmentConnection):
             return result
 
 
+def _open_process_fd(process: subprocess.Popen) -> int | None:
+    """Return a file descriptor that becomes readable as soon as the given
+    process exits, if the platform supports it (Linux 5.3+)."""
+
+    pidfd_open = getattr(os, "pidfd_open", None)
+    if pidfd_open is None:
+        return None
+
+    try:
+        return pidfd_open(process.pid)
+    except OSError:
+        return None
+
+
 @dataclass
 class PythonIPC(PythonExecutionBase[AgentListener], IsolatedProcessConnection):
     def get_python_cmd(
@@ -204,7 +203,6 @@ class PythonIPC(PythonExecutionBase[AgentListener], IsolatedProcessConnection):
         connection: AgentListener,
         log_fd: int,
     ) -> list[str | Path]:
-        assert isinstance(connection.address, tuple)
         return [
             executable,
             agent_startup.__file__,
@@ -1,7 +1,8 @@
 # This file defines an "isolate" agent for inter-process communication over
-# sockets. It is spawned by the controller process with a single argument (a
-# base64 encoded server address) and expected to go through the following procedures:
-#   1. Decode the given address
+# sockets. It is spawned by the controller process with a single argument (the
+# server address, either a host:port pair or the path of a UNIX domain socket) and
+# expected to go through the following procedures:
+#   1. Parse the given address
 #   2. Create a connection to the transmission bridge using the address
 #   3. Receive a callable object from the bridge
 #   4. Execute the callable object
@@ -17,21 +18,27 @@
 
 from __future__ import annotations
 
-import base64
+import functools
 import importlib
 import os
+import pickle
+import socket
 import sys
 import time
 import traceback
 from argparse import ArgumentParser
 from contextlib import closing
-from multiprocessing.connection import Client
+from multiprocessing import resource_tracker
+from multiprocessing.connection import Client, Connection
+from multiprocessing.shared_memory import SharedMemory
 from typing import TYPE_CHECKING, Any, Callable, ContextManager
 
 if TYPE_CHECKING:
     # Somhow mypy can't figure out that `ConnectionWrapper`
     # really exists.
-    class ConnectionWrapper:
+    class ConnectionWrapper(Connection):
+        _conn: Any
+
         def __init__(
             self,
             connection: Any,
@@ -49,22 +56,209 @@ else:
     from multiprocessing.connection import ConnectionWrapper
 
 
-def decode_service_address(address: str) -> tuple[str, int]:
-    host, port = base64.b64decode(address).decode("utf-8").rsplit(":", 1)
+# Out-of-band buffers (see PEP 574) smaller than this threshold are still
+# serialized in-band, since the cost of setting up a shared memory segment
+# outweighs the copies for small payloads.
+SHARED_MEMORY_THRESHOLD = 64 * 1024
+
+# Serialization backends that follow the signature of pickle.dumps(), and can be
+# asked for a specific protocol. Protocol 5 (PEP 574) has a more compact encoding
+# for large binary payloads, and is available on every supported Python version.
+PICKLE_COMPATIBLE_BACKENDS = frozenset({"pickle", "dill", "cloudpickle"})
+PICKLE_PROTOCOL = 5
+
+# Shared memory segments are passed around by name, which is only safe on
+# POSIX systems (on Windows, the segment is destroyed as soon as the sender
+# closes its handle, even if the receiver hasn't mapped it yet).
+SHARED_MEMORY_SUPPORTED = os.name == "posix"
+
+# Minimum size of the kernel send/receive buffers of the bridge socket. The
+# defaults (especially for UNIX domain sockets) are much smaller than a typical
+# serialized payload. The kernel silently caps this at net.core.{w,r}mem_max.
+SOCKET_BUFFER_SIZE = 1024 * 1024
+
+
+def decode_service_address(address: str) -> tuple[str, int] | str:
+    if address.startswith("/"):
+        # UNIX domain sockets are identified by their (absolute) path.
+        return address
+
+    host, port = address.rsplit(":", 1)
     return host, int(port)
 
 
-def child_connection(
-    serialization_method: str, address: tuple[str, int]
-) -> ContextManager[ConnectionWrapper]:
+def set_socket_options(connection: Connection) -> None:
+    """Tune the socket behind the given connection for the bridge traffic.
+
+    Nagle's algorithm is disabled (if it is a TCP socket), since multiprocessing
+    writes the length header and the payload separately and buffering small
+    writes only delays the delivery (until the peer's delayed ACK kicks in). The
+    send/receive buffers are also raised to at least SOCKET_BUFFER_SIZE, so that
+    large payloads are moved in fewer (and bigger) chunks."""
+
+    with socket.socket(fileno=os.dup(connection.fileno())) as sock:
+        if sock.family in (socket.AF_INET, socket.AF_INET6):
+            sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+
+        for option in (socket.SO_SNDBUF, socket.SO_RCVBUF):
+            if sock.getsockopt(socket.SOL_SOCKET, option) < SOCKET_BUFFER_SIZE:
+                sock.setsockopt(socket.SOL_SOCKET, option, SOCKET_BUFFER_SIZE)
+
+
+def dumps_with_shared_memory(obj: Any) -> tuple[bytes, list[tuple[str, int]]]:
+    """Serialize the given object with pickle protocol 5, moving every large
+    out-of-band buffer into its own shared memory segment. Returns the pickle
+    stream along with the names/sizes of the segments it references.
+
+    The ownership of the segments is transferred to the receiving side, which
+    is responsible for unlinking them (see loads_with_shared_memory)."""
+
+    buffers: list[pickle.PickleBuffer] = []
+
+    def buffer_callback(buffer: pickle.PickleBuffer) -> bool:
+        if buffer.raw().nbytes < SHARED_MEMORY_THRESHOLD:
+            return True
+
+        buffers.append(buffer)
+        return False
+
+    data = pickle.dumps(obj, protocol=PICKLE_PROTOCOL, buffer_callback=buffer_callback)
+
+    segments: list[tuple[str, int]] = []
+    try:
+        for buffer in buffers:
+            raw_buffer = buffer.raw()
+            segment = SharedMemory(create=True, size=raw_buffer.nbytes)
+            # The receiver will unlink the segment once it is done with it, so
+            # it shouldn't be reclaimed by our own resource tracker on exit.
+            resource_tracker.unregister(segment._name, "shared_memory")  # type: ignore
+            segments.append((segment.name, raw_buffer.nbytes))
+            try:
+                segment.buf[: raw_buffer.nbytes] = raw_buffer
+            finally:
+                segment.close()
+    except BaseException:
+        unlink_segments(segments)
+        raise
+
+    return data, segments
+
+
+def loads_with_shared_memory(data: bytes, segments: list[tuple[str, int]]) -> Any:
+    """Deserialize an object that was serialized with dumps_with_shared_memory,
+    and unlink all the shared memory segments it references."""
+
+    buffers = []
+    try:
+        for name, size in segments:
+            segment = SharedMemory(name=name)
+            try:
+                buffers.append(bytearray(segment.buf[:size]))
+            finally:
+                segment.close()
+                segment.unlink()
+    except BaseException:
+        # Don't leak the rest of the segments.
+        unlink_segments(segments)
+        raise
+
+    return pickle.loads(data, buffers=buffers)
+
+
+def unlink_segments(segments: list[tuple[str, int]]) -> None:
+    """Unlink the given shared memory segments (if they still exist)."""
+
+    for name, _ in segments:
+        try:
+            segment = SharedMemory(name=name)
+        except FileNotFoundError:
+            continue
+
+        segment.close()
+        segment.unlink()
+
+
+# Prefix of the frame that carries the shared memory segments of the next frame.
+# A protocol 5 pickle stream always starts with b"\x80\x05", so it can't be
+# confused with a regular message.
+_SEGMENTS_FRAME_PREFIX = b"isolate-shm:"
+
+
+class SharedMemoryConnectionWrapper(ConnectionWrapper):
+    """A pickle connection that transfers large out-of-band buffers through
+    shared memory instead of copying them over the socket.
+
+    Messages without any such buffers are sent as a single, plain pickle stream.
+    Otherwise the table of segments is sent first (in its own frame), followed
+    by the pickle stream itself."""
+
+    def __init__(self, connection: Connection) -> None:
+        super().__init__(connection, loads=pickle.loads, dumps=pickle.dumps)
+
+    def send(self, value: Any) -> None:
+        data, segments = dumps_with_shared_memory(value)
+        try:
+            if segments:
+                self._conn.send_bytes(
+                    _SEGMENTS_FRAME_PREFIX
+                    + pickle.dumps(segments, protocol=PICKLE_PROTOCOL)
+                )
+            self._conn.send_bytes(data)
+        except BaseException:
+            unlink_segments(segments)
+            raise
+
+    def recv(self) -> Any:
+        frame = self._conn.recv_bytes()
+        if not frame.startswith(_SEGMENTS_FRAME_PREFIX):
+            return pickle.loads(frame)
+
+        segments = pickle.loads(frame[len(_SEGMENTS_FRAME_PREFIX) :])
+        try:
+            data = self._conn.recv_bytes()
+        except BaseException:
+            unlink_segments(segments)
+            raise
+        return loads_with_shared_memory(data, segments)
+
+
+@functools.lru_cache(maxsize=16)
+def serialization_functions(
+    serialization_method: str,
+) -> tuple[Callable[[bytes], Any], Callable[[Any], bytes]]:
+    """Return the loads/dumps functions to use for the given serialization
+    method on the bridge."""
+
     serialization_backend = importlib.import_module(serialization_method)
-    return closing(
-        ConnectionWrapper(
-            Client(address),
-            loads=serialization_backend.loads,
-            dumps=serialization_backend.dumps,
+    if serialization_method in PICKLE_COMPATIBLE_BACKENDS:
+        return serialization_backend.loads, functools.partial(
+            serialization_backend.dumps, protocol=PICKLE_PROTOCOL
         )
-    )
+
+    return serialization_backend.loads, serialization_backend.dumps
+
+
+def wrap_connection(
+    connection: Connection, serialization_method: str
+) -> ConnectionWrapper:
+    """Wrap the given bridge connection with the given serialization method."""
+
+    if serialization_method == "pickle" and SHARED_MEMORY_SUPPORTED:
+        # Fast path for pickle: large buffers are transferred through shared
+        # memory (with protocol 5's out-of-band buffers) instead of being
+        # copied over the socket.
+        return SharedMemoryConnectionWrapper(connection)
+
+    loads, dumps = serialization_functions(serialization_method)
+    return ConnectionWrapper(connection, loads=loads, dumps=dumps)
+
+
+def child_connection(
+    serialization_method: str, address: tuple[str, int] | str
+) -> ContextManager[ConnectionWrapper]:
+    connection = Client(address)
+    set_socket_options(connection)
+    return closing(wrap_connection(connection, serialization_method))
 
 
 IS_DEBUG_MODE = os.getenv("ISOLATE_ENABLE_DEBUGGING") == "1"
@@ -73,7 +267,7 @@ DEBUG_TIMEOUT = 60 * 15
 
 def run_client(
     serialization_method: str,
-    address: tuple[str, int],
+    address: tuple[str, int] | str,
     *,
     with_pdb: bool = False,
     log_fd: int | None = None,
@@ -127,7 +321,7 @@ def run_client(
         except BaseException as exc:
             result = exc
             did_it_raise = True
-            num_frames = len(traceback.extract_stack()[:-4])
+            num_frames = max(_get_stack_depth() - 4, 0)
             stringized_tb = "".join(traceback.format_exc(limit=-num_frames))
         finally:
             try:
@@ -146,6 +340,19 @@ def run_client(
                 raise
 
 
+def _get_stack_depth() -> int:
+    """Return the number of frames in the caller's stack (including the
+    caller itself). This is much cheaper than len(traceback.extract_stack())
+    since it doesn't need to look up the source lines."""
+
+    depth = 0
+    frame = sys._getframe(1)
+    while frame is not None:
+        depth += 1
+        frame = frame.f_back  # type: ignore[assignment]
+    return depth
+
+
 def _get_shell_bootstrap() -> str:
     # Return a string that contains environment variables that
     # might be used during isolated hook's execution.
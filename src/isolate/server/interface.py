@@ -3,12 +3,19 @@ from typing import Any, Dict
 from isolate.backends import BaseEnvironment
 from isolate.connections.grpc.interface import (
     from_grpc,
+    log_to_grpc,
     to_grpc,
     to_serialized_object,
 )
 from isolate.server import definitions
 
-__all__ = ["from_grpc", "to_grpc", "to_serialized_object", "to_struct"]
+__all__ = [
+    "from_grpc",
+    "log_to_grpc",
+    "to_grpc",
+    "to_serialized_object",
+    "to_struct",
+]
 
 
 @from_grpc.register
@@ -2,19 +2,18 @@ from __future__ import annotations
 
 import functools
 import os
+import subprocess
 import threading
 import time
 import traceback
 import uuid
 from argparse import ArgumentParser
-from collections import defaultdict
+from collections import defaultdict, deque
 from concurrent import futures
-from concurrent.futures import ThreadPoolExecutor
 from contextlib import ExitStack, contextmanager
 from dataclasses import dataclass, field, replace
 from queue import Empty as QueueEmpty
-from queue import Queue
-from typing import Any, Callable, Iterator, cast
+from typing import Any, Generic, Iterator, TypeVar, cast
 
 import grpc
 from grpc import ServicerContext, StatusCode
@@ -28,35 +27,128 @@ from isolate.backends.common import active_python
 from isolate.backends.local import LocalPythonEnvironment
 from isolate.backends.virtualenv import VirtualPythonEnvironment
 from isolate.connections.grpc import AgentError, LocalPythonGRPC
-from isolate.connections.grpc.configuration import get_default_options
+from isolate.connections.grpc.configuration import get_default_server_options
 from isolate.logger import IsolateLogger
 from isolate.logs import Log, LogLevel, LogSource
 from isolate.server import definitions, health
 from isolate.server.health_server import HealthServicer
-from isolate.server.interface import from_grpc, to_grpc
+from isolate.server.interface import from_grpc, log_to_grpc
 
 EMPTY_MESSAGE_INTERVAL = float(os.getenv("ISOLATE_EMPTY_MESSAGE_INTERVAL", "600"))
 SKIP_EMPTY_LOGS = os.getenv("ISOLATE_SKIP_EMPTY_LOGS") == "1"
 MAX_GRPC_WAIT_TIMEOUT = float(os.getenv("ISOLATE_MAX_GRPC_WAIT_TIMEOUT", "10.0"))
 
+# How long to wait (in seconds) for a canceled task to finish before giving up.
+MAX_CANCEL_WAIT = float(os.getenv("ISOLATE_MAX_CANCEL_WAIT", "10.0"))
+
+# Maximum number of log entries to send in a single PartialRunResult. Logs that
+# are already waiting in the queue are coalesced into one message (up to this
+# many), instead of being sent one by one.
+MAX_LOG_BATCH_SIZE = int(os.getenv("ISOLATE_MAX_LOG_BATCH_SIZE", "32"))
+
+# Builder and bridge logs below this level are not streamed to the client (but
+# they are still logged by the server). The user's own output is always streamed,
+# even when its level is inferred from a marker like "[debug]" in the line.
+MIN_STREAM_LOG_LEVEL = LogLevel[os.getenv("ISOLATE_MIN_STREAM_LOG", "TRACE").upper()]
+
+# Whether to print a line for every submitted task (and when it finishes).
+DEBUG_TASK_LOG = os.getenv("ISOLATE_DEBUG_TASK_LOG") == "1"
+
 # Whether to inherit all the packages from the current environment or not.
 INHERIT_FROM_LOCAL = os.getenv("ISOLATE_INHERIT_FROM_LOCAL") == "1"
 
 # Number of threads that the gRPC server will use.
-MAX_THREADS = int(os.getenv("MAX_THREADS", "5"))
+MAX_THREADS = int(os.getenv("ISOLATE_SERVING_THREADS", os.getenv("MAX_THREADS", "5")))
+
+# Number of threads that run the submitted tasks in the background. These are
+# separate from the gRPC server's threads, so that long-running background tasks
+# can't prevent the server from handling new requests.
+MAX_RUNNER_THREADS = int(os.getenv("ISOLATE_RUNNER_THREADS", str(MAX_THREADS)))
 _AGENT_REQUIREMENTS_TXT = os.getenv("AGENT_REQUIREMENTS_TXT")
 
+# Kept as a tuple since it is shared by all the runs (each agent environment gets
+# its own copy as a list).
+AGENT_REQUIREMENTS: tuple[str, ...]
 if _AGENT_REQUIREMENTS_TXT is not None:
     with open(_AGENT_REQUIREMENTS_TXT) as stream:
-        AGENT_REQUIREMENTS = stream.read().splitlines()
+        AGENT_REQUIREMENTS = tuple(stream.read().splitlines())
 else:
-    AGENT_REQUIREMENTS = []
+    AGENT_REQUIREMENTS = ()
 
 
-# Number of seconds to observe the queue before checking the termination
-# event.
-_Q_WAIT_DELAY = 0.1
-RUNNER_THREAD_POOL = futures.ThreadPoolExecutor(max_workers=MAX_THREADS)
+T = TypeVar("T")
+
+RUNNER_THREAD_POOL = futures.ThreadPoolExecutor(
+    max_workers=MAX_RUNNER_THREADS,
+    thread_name_prefix="isolate-runner",
+)
+
+
+def new_bridge_thread_pool(num_serving_threads: int) -> futures.ThreadPoolExecutor:
+    """Create the pool of threads that create the environments and proxy the
+    agent's messages. Every run (either from a serving thread for Run, or from a
+    runner thread for Submit) holds one of these threads until it is finished,
+    so the pool is sized to serve all of them at the same time."""
+    return futures.ThreadPoolExecutor(
+        max_workers=num_serving_threads + MAX_RUNNER_THREADS,
+        thread_name_prefix="isolate-bridge",
+    )
+
+
+# An empty (but 'real') message that is periodically sent to the client while
+# waiting for a task. It is never mutated, so the same instance is shared.
+_EMPTY_KEEPALIVE = definitions.PartialRunResult(
+    is_complete=False,
+    logs=[],
+    result=None,
+)
+
+
+class _CompletionMarker:
+    """Put into a message queue once the task that is being watched is done."""
+
+
+@dataclass
+class MessageQueue(Generic[T]):
+    """A minimal unbounded FIFO queue for passing messages from any number of
+    producer threads to a single consumer. Unlike queue.Queue, putting an item
+    does not need to acquire any locks (unless the consumer is waiting on it)."""
+
+    _items: deque[T] = field(default_factory=deque)
+    _has_items: threading.Event = field(default_factory=threading.Event)
+
+    def put_nowait(self, item: T) -> None:
+        self._items.append(item)
+        # The consumer always re-checks the items after clearing the event,
+        # so it is fine to skip setting it when it is already set.
+        if not self._has_items.is_set():
+            self._has_items.set()
+
+    def get_nowait(self) -> T:
+        try:
+            return self._items.popleft()
+        except IndexError:
+            raise QueueEmpty from None
+
+    def get(self, timeout: float | None = None) -> T:
+        deadline = None if timeout is None else time.monotonic() + timeout
+        while True:
+            try:
+                return self._items.popleft()
+            except IndexError:
+                pass
+
+            if deadline is None:
+                self._has_items.wait()
+            else:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    raise QueueEmpty
+                self._has_items.wait(remaining)
+            self._has_items.clear()
+
+    def empty(self) -> bool:
+        return not self._items
 
 
 class GRPCException(Exception):
@@ -72,9 +164,10 @@ class GRPCException(Exception):
 @dataclass
 class RunnerAgent:
     stub: definitions.AgentStub
-    message_queue: Queue[definitions.PartialRunResult]
+    message_queue: MessageQueue[definitions.PartialRunResult | definitions.Log]
     _bound_context: ExitStack
     _channel_state_history: list[grpc.ChannelConnectivity] = field(default_factory=list)
+    _process: subprocess.Popen | None = None
 
     def __post_init__(self):
         def switch_state(connectivity_update: grpc.ChannelConnectivity) -> None:
@@ -100,6 +193,11 @@ class RunnerAgent:
         # TODO: This is more of a hack rather than a guaranteed health check,
         # we might have to introduce the proper protocol to the agents as well
         # to make sure that they are ready to receive requests.
+        if self._process is not None and self._process.poll() is not None:
+            # The channel might not have noticed yet that the agent is gone
+            # (e.g. if it was killed right before this check).
+            return False
+
         return self.is_accessible
 
     def terminate(self) -> None:
@@ -118,30 +216,34 @@ class BridgeManager:
     def establish(
         self,
         connection: LocalPythonGRPC,
-        queue: Queue,
+        queue: MessageQueue,
     ) -> Iterator[RunnerAgent]:
-        agent = self._allocate_new_agent(connection, queue)
+        # The key is computed once (outside of the lock) and shared between
+        # the allocation and the caching of the agent.
+        key = self._identify(connection)
+        agent = self._allocate_new_agent(key, connection, queue)
 
         try:
             yield agent
         finally:
-            self._cache_agent(connection, agent)
+            self._cache_agent(key, agent)
 
     def _cache_agent(
         self,
-        connection: LocalPythonGRPC,
+        key: tuple[Any, ...],
         agent: RunnerAgent,
     ) -> None:
         with self._agent_access_lock:
-            self._agents[self._identify(connection)].append(agent)
+            self._agents[key].append(agent)
 
     def _allocate_new_agent(
         self,
+        key: tuple[Any, ...],
         connection: LocalPythonGRPC,
-        queue: Queue,
+        queue: MessageQueue,
     ) -> RunnerAgent:
         with self._agent_access_lock:
-            available_agents = self._agents[self._identify(connection)]
+            available_agents = self._agents[key]
             while available_agents:
                 agent = available_agents.pop()
                 if agent.check_connectivity():
@@ -153,7 +255,9 @@ class BridgeManager:
         stub = bound_context.enter_context(
             connection._establish_bridge(max_wait_timeout=MAX_GRPC_WAIT_TIMEOUT)
         )
-        return RunnerAgent(stub, queue, bound_context)
+        return RunnerAgent(
+            stub, queue, bound_context, _process=connection._agent_process
+        )
 
     def _identify(self, connection: LocalPythonGRPC) -> tuple[Any, ...]:
         return (
@@ -176,17 +280,31 @@ class RunTask:
     future: futures.Future | None = None
     agent: RunnerAgent | None = None
     logger: IsolateLogger = field(default_factory=IsolateLogger.from_env)
+    _is_canceled: bool = False
 
     def cancel(self):
-        while True:
+        # The agent might not be allocated yet, in which case the task stops
+        # itself (without running the function) before it gets one.
+        self._is_canceled = True
+        if self.future is not None:
             self.future.cancel()
-            if self.agent:
-                self.agent.terminate()
-            try:
-                self.future.exception(timeout=0.1)
-                return
-            except futures.TimeoutError:
-                pass
+        if self.agent:
+            self.agent.terminate()
+
+        if self.future is None:
+            # Tasks from Run are executed by the caller itself, so there is
+            # nothing to wait for.
+            return
+
+        try:
+            self.future.exception(timeout=MAX_CANCEL_WAIT)
+        except futures.CancelledError:
+            pass
+        except futures.TimeoutError:
+            print(
+                f"Task did not finish in {MAX_CANCEL_WAIT} seconds after being "
+                "canceled, giving up on waiting for it"
+            )
 
     @property
     def stream_logs(self) -> bool:
@@ -198,9 +316,13 @@ class IsolateServicer(definitions.IsolateServicer):
     bridge_manager: BridgeManager
     default_settings: IsolateSettings = field(default_factory=IsolateSettings)
     background_tasks: dict[str, RunTask] = field(default_factory=dict)
+    bridge_thread_pool: futures.ThreadPoolExecutor = field(
+        default_factory=lambda: new_bridge_thread_pool(MAX_THREADS)
+    )
+    _tasks_lock: threading.Lock = field(default_factory=threading.Lock)
 
     def _run_task(self, task: RunTask) -> Iterator[definitions.PartialRunResult]:
-        messages: Queue[definitions.PartialRunResult] = Queue()
+        messages: MessageQueue = MessageQueue()
         environments = []
         for env in task.request.environments:
             try:
@@ -234,7 +356,7 @@ class IsolateServicer(definitions.IsolateServicer):
                 primary_environment, "python_version", active_python()
             )
             agent_environ = VirtualPythonEnvironment(
-                requirements=AGENT_REQUIREMENTS,
+                requirements=list(AGENT_REQUIREMENTS),
                 python_version=python_version,
             )
             agent_environ.apply_settings(run_settings)
@@ -245,80 +367,86 @@ class IsolateServicer(definitions.IsolateServicer):
             local_environment = LocalPythonEnvironment()
             extra_inheritance_paths.append(local_environment.create())
 
-        with ThreadPoolExecutor(max_workers=1) as local_pool:
-            environment_paths = []
-            for should_force_create, environment in environments:
-                future = local_pool.submit(
-                    environment.create, force=should_force_create
-                )
-                yield from self.watch_queue_until_completed(messages, future.done)
-                try:
-                    # Assuming that the iterator above only stops yielding once
-                    # the future is completed, the timeout here should be redundant
-                    # but it is just in case.
-                    environment_paths.append(future.result(timeout=0.1))
-                except EnvironmentCreationError as e:
-                    raise GRPCException(f"{e}", StatusCode.INVALID_ARGUMENT)
-
-            primary_path, *inheritance_paths = environment_paths
-            inheritance_paths.extend(extra_inheritance_paths)
-            _, primary_environment = environments[0]
-
-            connection = LocalPythonGRPC(
-                primary_environment,
-                primary_path,
-                extra_inheritance_paths=inheritance_paths,
+        environment_paths = []
+        for should_force_create, environment in environments:
+            future = self.bridge_thread_pool.submit(
+                environment.create, force=should_force_create
             )
+            yield from self.watch_queue_until_completed(messages, future)
+            try:
+                # Assuming that the iterator above only stops yielding once
+                # the future is completed, the timeout here should be redundant
+                # but it is just in case.
+                environment_paths.append(future.result(timeout=0.1))
+            except EnvironmentCreationError as e:
+                raise GRPCException(f"{e}", StatusCode.INVALID_ARGUMENT)
+
+        primary_path, *inheritance_paths = environment_paths
+        inheritance_paths.extend(extra_inheritance_paths)
+
+        connection = LocalPythonGRPC(
+            primary_environment,
+            primary_path,
+            extra_inheritance_paths=inheritance_paths,
+        )
 
-            with self.bridge_manager.establish(connection, queue=messages) as agent:
-                task.agent = agent
+        if task._is_canceled:
+            raise GRPCException("The task was canceled.", StatusCode.CANCELLED)
+
+        with self.bridge_manager.establish(connection, queue=messages) as agent:
+            task.agent = agent
+            # The task might have been canceled while the agent was starting.
+            if task._is_canceled:
+                raise GRPCException("The task was canceled.", StatusCode.CANCELLED)
+
+            if task.request.HasField("setup_func"):
                 function_call = definitions.FunctionCall(
                     function=task.request.function,
                     setup_func=task.request.setup_func,
                 )
-                if not task.request.HasField("setup_func"):
-                    function_call.ClearField("setup_func")
-
-                future = local_pool.submit(
-                    _proxy_to_queue,
-                    # The agent may have been cached, so use the agent's message queue
-                    queue=agent.message_queue,
-                    bridge=agent.stub,
-                    input=function_call,
+            else:
+                function_call = definitions.FunctionCall(
+                    function=task.request.function,
                 )
 
-                # Unlike above; we are not interested in the result value of future
-                # here, since it will be already transferred to other side without
-                # us even seeing (through the queue).
-                yield from self.watch_queue_until_completed(
-                    agent.message_queue, future.done
-                )
+            future = self.bridge_thread_pool.submit(
+                _proxy_to_queue,
+                # The agent may have been cached, so use the agent's message queue
+                queue=agent.message_queue,
+                bridge=agent.stub,
+                input=function_call,
+            )
 
-                # But we still have to check whether there were any errors raised
-                # during the execution, and handle them accordingly.
-                exception = future.exception(timeout=0.1)
-                if exception is not None:
-                    # If this is an RPC error, propagate it as is without any
-                    # further processing.
-                    if isinstance(exception, grpc.RpcError):
-                        raise GRPCException(
-                            str(exception),
-                            exception.code(),
-                        )
-
-                    # Otherwise this is a bug in the agent itself, so needs
-                    # to be propagated with more details.
-                    for line in traceback.format_exception(
-                        type(exception), exception, exception.__traceback__
-                    ):
-                        yield from self.log(line, level=LogLevel.ERROR)
-                    if isinstance(exception, AgentError):
-                        raise GRPCException(str(exception), StatusCode.ABORTED)
-                    else:
-                        raise GRPCException(
-                            f"An unexpected error occurred: {exception}.",
-                            StatusCode.UNKNOWN,
-                        )
+            # Unlike above; we are not interested in the result value of future
+            # here, since it will be already transferred to other side without
+            # us even seeing (through the queue).
+            yield from self.watch_queue_until_completed(agent.message_queue, future)
+
+            # But we still have to check whether there were any errors raised
+            # during the execution, and handle them accordingly.
+            exception = future.exception(timeout=0.1)
+            if exception is not None:
+                # If this is an RPC error, propagate it as is without any
+                # further processing.
+                if isinstance(exception, grpc.RpcError):
+                    raise GRPCException(
+                        str(exception),
+                        exception.code(),
+                    )
+
+                # Otherwise this is a bug in the agent itself, so needs
+                # to be propagated with more details.
+                for line in traceback.format_exception(
+                    type(exception), exception, exception.__traceback__
+                ):
+                    yield from self.log(line, level=LogLevel.ERROR)
+                if isinstance(exception, AgentError):
+                    raise GRPCException(str(exception), StatusCode.ABORTED)
+                else:
+                    raise GRPCException(
+                        f"An unexpected error occurred: {exception}.",
+                        StatusCode.UNKNOWN,
+                    )
 
     def _run_task_in_background(self, task: RunTask) -> None:
         for _ in self._run_task(task):
@@ -332,21 +460,32 @@ class IsolateServicer(definitions.IsolateServicer):
         task = RunTask(request=request.function)
         self.set_metadata(task, request.metadata)
 
-        task.future = RUNNER_THREAD_POOL.submit(self._run_task_in_background, task)
         task_id = str(uuid.uuid4())
 
-        print(f"Submitted a task {task_id}")
+        # The task is registered before it is started, otherwise a task that
+        # finishes immediately would be registered after its callback ran (and
+        # it would never be removed).
+        with self._tasks_lock:
+            self.background_tasks[task_id] = task
 
-        self.background_tasks[task_id] = task
+        task.future = RUNNER_THREAD_POOL.submit(self._run_task_in_background, task)
+
+        if DEBUG_TASK_LOG:
+            print(f"Submitted a task {task_id}")
 
         def _callback(future: futures.Future) -> None:
-            msg = f"Task {task_id} finished with"
-            if exc := future.exception():
-                msg += f" error: {exc!r}"
-            else:
-                msg += f" result: {future.result()!r}"
-            print(msg)
-            self.background_tasks.pop(task_id, None)
+            if DEBUG_TASK_LOG:
+                msg = f"Task {task_id} finished with"
+                if future.cancelled():
+                    msg += " cancellation"
+                elif exc := future.exception():
+                    msg += f" error: {exc!r}"
+                else:
+                    msg += f" result: {future.result()!r}"
+                print(msg)
+
+            with self._tasks_lock:
+                self.background_tasks.pop(task_id, None)
 
         task.future.add_done_callback(_callback)
 
@@ -357,13 +496,16 @@ class IsolateServicer(definitions.IsolateServicer):
         request: definitions.SetMetadataRequest,
         context: ServicerContext,
     ) -> definitions.SetMetadataResponse:
-        if request.task_id not in self.background_tasks:
+        with self._tasks_lock:
+            task = self.background_tasks.get(request.task_id)
+
+        if task is None:
             raise GRPCException(
                 f"Task {request.task_id} not found.",
                 StatusCode.NOT_FOUND,
             )
 
-        self.set_metadata(self.background_tasks[request.task_id], request.metadata)
+        self.set_metadata(task, request.metadata)
 
         return definitions.SetMetadataResponse()
 
@@ -380,7 +522,8 @@ class IsolateServicer(definitions.IsolateServicer):
 
             # HACK: we can support only one task at a time
             # TODO: move away from this when we use submit for env-aware tasks
-            self.background_tasks["RUN"] = task
+            with self._tasks_lock:
+                self.background_tasks["RUN"] = task
             yield from self._run_task(task)
         except GRPCException as exc:
             return self.abort_with_msg(
@@ -389,18 +532,19 @@ class IsolateServicer(definitions.IsolateServicer):
                 code=exc.code,
             )
         finally:
-            self.background_tasks.pop("RUN", None)
+            with self._tasks_lock:
+                self.background_tasks.pop("RUN", None)
 
     def List(
         self,
         request: definitions.ListRequest,
         context: ServicerContext,
     ) -> definitions.ListResponse:
+        with self._tasks_lock:
+            task_ids = list(self.background_tasks)
+
         return definitions.ListResponse(
-            tasks=[
-                definitions.TaskInfo(task_id=task_id)
-                for task_id in self.background_tasks.keys()
-            ]
+            tasks=[definitions.TaskInfo(task_id=task_id) for task_id in task_ids]
         )
 
     def Cancel(
@@ -411,41 +555,89 @@ class IsolateServicer(definitions.IsolateServicer):
         task_id = request.task_id
 
         print(f"Canceling task {task_id}")
-        task = self.background_tasks.get(task_id)
+        with self._tasks_lock:
+            task = self.background_tasks.get(task_id)
+
         if task is not None:
             task.cancel()
 
         return definitions.CancelResponse()
 
     def watch_queue_until_completed(
-        self, queue: Queue, is_completed: Callable[[], bool]
+        self, queue: MessageQueue, future: futures.Future
     ) -> Iterator[definitions.PartialRunResult]:
-        """Watch the given queue until the is_completed function returns True.
-        Note that even if the function is completed, this function might not
-        finish until the queue is empty.
+        """Watch the given queue until the given future is completed. Note that
+        even if the future is completed, this function might not finish until
+        the queue is empty.
         """
 
+        # Wake up the watcher as soon as the future is done (instead of polling
+        # it), with a marker that is unique to this watch since the queue might
+        # be shared with later runs (e.g. for cached agents).
+        completion_marker = _CompletionMarker()
+        future.add_done_callback(lambda _: queue.put_nowait(completion_marker))
+
+        is_completed = False
         timer = time.monotonic()
-        while not is_completed():
-            try:
-                yield queue.get(timeout=_Q_WAIT_DELAY)
-            except QueueEmpty:
-                # Send an empty (but 'real') packet to the client, currently a hacky way
-                # to make sure the stream results are never ignored.
-                if time.monotonic() - timer > EMPTY_MESSAGE_INTERVAL:
+        message = None
+        while True:
+            if message is None:
+                try:
+                    if is_completed:
+                        message = queue.get_nowait()
+                    else:
+                        timeout = timer + EMPTY_MESSAGE_INTERVAL - time.monotonic()
+                        message = queue.get(timeout=max(timeout, 0))
+                except QueueEmpty:
+                    if is_completed:
+                        # All the final messages are cleared.
+                        break
+
+                    # Send an empty (but 'real') packet to the client, currently a
+                    # hacky way to make sure the stream results are never ignored.
                     timer = time.monotonic()
-                    yield definitions.PartialRunResult(
-                        is_complete=False,
-                        logs=[],
-                        result=None,
-                    )
+                    yield _EMPTY_KEEPALIVE
+                    continue
+
+            if message is completion_marker:
+                is_completed = True
+                message = None
+            elif isinstance(message, definitions.Log):
+                logs, message = self._collect_logs(queue, message)
+                yield definitions.PartialRunResult(
+                    is_complete=False,
+                    logs=logs,
+                    result=None,
+                )
+            else:
+                # Markers of the previous watches are simply ignored.
+                if not isinstance(message, _CompletionMarker):
+                    yield message
+                message = None
 
-        # Clear the final messages
-        while not queue.empty():
+    def _collect_logs(
+        self,
+        queue: MessageQueue,
+        log: definitions.Log,
+    ) -> tuple[list[definitions.Log], Any]:
+        """Collect the given log along with the rest of the logs that are already
+        waiting in the queue (up to MAX_LOG_BATCH_SIZE), so they can be sent in a
+        single partial result. The first non-log message taken from the queue (if
+        any) is returned as well, to be processed next."""
+
+        logs = [log]
+        while len(logs) < MAX_LOG_BATCH_SIZE:
             try:
-                yield queue.get_nowait()
+                message = queue.get_nowait()
             except QueueEmpty:
-                continue
+                break
+
+            if not isinstance(message, definitions.Log):
+                return logs, message
+
+            logs.append(message)
+
+        return logs, None
 
     def log(
         self,
@@ -453,8 +645,7 @@ class IsolateServicer(definitions.IsolateServicer):
         level: LogLevel = LogLevel.TRACE,
         source: LogSource = LogSource.BRIDGE,
     ) -> Iterator[definitions.PartialRunResult]:
-        log = to_grpc(Log(message, level=level, source=source))
-        log = cast(definitions.Log, log)
+        log = log_to_grpc(Log(message, level=level, source=source))
         yield definitions.PartialRunResult(result=None, is_complete=False, logs=[log])
 
     def abort_with_msg(
@@ -469,13 +660,15 @@ class IsolateServicer(definitions.IsolateServicer):
         return None
 
     def cancel_tasks(self):
-        tasks_copy = self.background_tasks.copy()
+        with self._tasks_lock:
+            tasks_copy = self.background_tasks.copy()
+
         for task in tasks_copy.values():
             task.cancel()
 
 
 def _proxy_to_queue(
-    queue: Queue,
+    queue: MessageQueue,
     bridge: definitions.AgentStub,
     input: definitions.FunctionCall,
 ) -> None:
@@ -485,7 +678,7 @@ def _proxy_to_queue(
 
 @dataclass
 class LogHandler:
-    messages: Queue
+    messages: MessageQueue
     # Reference to the task so we can change the logger
     task: RunTask
 
@@ -495,18 +688,17 @@ class LogHandler:
             self._add_log_to_queue(log)
 
     def _add_log_to_queue(self, log: Log) -> None:
-        if not self.task.stream_logs:
-            # We do not queue the logs if the stream_logs is disabled
-            # but still log them to the logger.
+        if not self.task.stream_logs or (
+            log.source != LogSource.USER and log.level < MIN_STREAM_LOG_LEVEL
+        ):
+            # We do not queue the logs if the stream_logs is disabled (or
+            # if they are not important enough) but still log them to the
+            # logger.
             return
 
-        grpc_log = cast(definitions.Log, to_grpc(log))
-        grpc_result = definitions.PartialRunResult(
-            is_complete=False,
-            logs=[grpc_log],
-            result=None,
-        )
-        self.messages.put_nowait(grpc_result)
+        # The logs are queued as is, and they are wrapped into partial results
+        # (in batches) by the consumer of the queue.
+        self.messages.put_nowait(log_to_grpc(log))
 
 
 @dataclass
@@ -590,7 +782,8 @@ class SingleTaskInterceptor(ServerBoundInterceptor):
                             time.sleep(0.1)
 
                         # Get the task from the background tasks
-                        task = self.servicer.background_tasks.get(self._task_id)
+                        with self.servicer._tasks_lock:
+                            task = self.servicer.background_tasks.get(self._task_id)
 
                         if task is not None:
                             # Wait until the task future is assigned
@@ -644,15 +837,18 @@ def main(argv: list[str] | None = None) -> None:
 
     options = parser.parse_args(argv)
     if options.num_workers is None:
-        options.num_workers = 1 if options.single_use else os.cpu_count()
+        options.num_workers = 1 if options.single_use else os.cpu_count() or 1
 
     interceptors: list[ServerBoundInterceptor] = []
     if options.single_use:
         interceptors.append(SingleTaskInterceptor())
 
     server = grpc.server(
-        futures.ThreadPoolExecutor(max_workers=options.num_workers),
-        options=get_default_options(),
+        futures.ThreadPoolExecutor(
+            max_workers=options.num_workers,
+            thread_name_prefix="isolate-grpc",
+        ),
+        options=get_default_server_options(),
         interceptors=interceptors,  # type: ignore
     )
 
@@ -660,7 +856,10 @@ def main(argv: list[str] | None = None) -> None:
         interceptor.register_server(server)
 
     with BridgeManager() as bridge_manager:
-        servicer = IsolateServicer(bridge_manager)
+        servicer = IsolateServicer(
+            bridge_manager,
+            bridge_thread_pool=new_bridge_thread_pool(options.num_workers),
+        )
 
         for interceptor in interceptors:
             interceptor.register_servicer(servicer)
@@ -1,4 +1,5 @@
 import operator
+import pickle
 import traceback
 from dataclasses import replace
 from functools import partial
@@ -12,6 +13,7 @@ from isolate.backends.settings import IsolateSettings
 from isolate.backends.virtualenv import VirtualPythonEnvironment
 from isolate.connections import LocalPythonGRPC, PythonIPC
 from isolate.connections.common import is_agent
+from isolate.connections.ipc import agent
 
 REPO_DIR = Path(__file__).parent.parent
 assert (
@@ -58,6 +60,20 @@ class GenericPythonConnectionTests:
             result = conn.run(partial(operator.add, 1, 2))
             assert result == 3
 
+    def test_large_payload(self):
+        local_env = LocalPythonEnvironment()
+
+        with self.open_connection(local_env, local_env.create()) as conn:
+            result = conn.run(partial(bytearray, 1024 * 1024))
+            assert result == bytearray(1024 * 1024)
+
+    def test_large_argument(self):
+        local_env = LocalPythonEnvironment()
+
+        with self.open_connection(local_env, local_env.create()) as conn:
+            result = conn.run(partial(len, bytes(1024 * 1024)))
+            assert result == 1024 * 1024
+
     @pytest.mark.parametrize("serialization_method", ["dill"])
     def test_customized_serialization(self, serialization_method: str) -> None:
         local_env = LocalPythonEnvironment()
@@ -191,6 +207,19 @@ class TestPythonIPC(GenericPythonConnectionTests):
     ) -> EnvironmentConnection:
         return PythonIPC(environment, environment_path, **kwargs)
 
+    @pytest.mark.skipif(
+        not agent.SHARED_MEMORY_SUPPORTED, reason="Requires shared memory."
+    )
+    def test_large_out_of_band_argument(self):
+        local_env = LocalPythonEnvironment()
+
+        # Unlike bytes, a pickle buffer is serialized out-of-band (and thus
+        # transferred through shared memory).
+        buffer = pickle.PickleBuffer(bytearray(b"x" * 1024 * 1024))
+        with self.open_connection(local_env, local_env.create()) as conn:
+            result = conn.run(partial(bytearray.count, buffer, b"x"))
+            assert result == 1024 * 1024
+
 
 class TestPythonGRPC(GenericPythonConnectionTests):
     def open_connection(
@@ -209,3 +238,45 @@ class TestPythonGRPC(GenericPythonConnectionTests):
         env = VirtualPythonEnvironment(requirements + [f"{REPO_DIR}[grpc]"])
         env.apply_settings(IsolateSettings(Path(tmp_path)))
         return env
+
+
+def shared_memory_exists(name: str) -> bool:
+    from multiprocessing.shared_memory import SharedMemory
+
+    try:
+        segment = SharedMemory(name=name)
+    except FileNotFoundError:
+        return False
+
+    segment.close()
+    return True
+
+
+@pytest.mark.skipif(not agent.SHARED_MEMORY_SUPPORTED, reason="Requires shared memory.")
+def test_shared_memory_serialization():
+    large_buffer = bytearray(b"x" * agent.SHARED_MEMORY_THRESHOLD)
+    small_buffer = bytearray(b"y" * (agent.SHARED_MEMORY_THRESHOLD - 1))
+
+    data, segments = agent.dumps_with_shared_memory(
+        [pickle.PickleBuffer(large_buffer), pickle.PickleBuffer(small_buffer)]
+    )
+
+    # Only the large buffer is moved into shared memory, and it is not part
+    # of the pickle stream itself.
+    [(name, size)] = segments
+    assert size == len(large_buffer)
+    assert large_buffer not in data
+    assert shared_memory_exists(name)
+
+    # The receiver unlinks the segment once it is loaded.
+    assert agent.loads_with_shared_memory(data, segments) == [
+        large_buffer,
+        small_buffer,
+    ]
+    assert not shared_memory_exists(name)
+
+    # Objects without any (large) out-of-band buffers are serialized as a
+    # plain pickle stream.
+    data, segments = agent.dumps_with_shared_memory(bytes(1024 * 1024))
+    assert not segments
+    assert pickle.loads(data) == bytes(1024 * 1024)
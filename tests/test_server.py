@@ -1,25 +1,34 @@
 import copy
 import textwrap
+import threading
 from concurrent import futures
 from contextlib import contextmanager
 from dataclasses import dataclass
 from functools import partial
 from pathlib import Path
+from queue import Empty as QueueEmpty
 from typing import Any, Iterator, List, Optional, cast
 
 import grpc
 import pytest
 from isolate.backends.settings import IsolateSettings
-from isolate.connections.grpc.configuration import get_default_options
+from isolate.connections.grpc.configuration import (
+    get_default_options,
+    get_default_server_options,
+)
 from isolate.logs import Log, LogLevel, LogSource
 from isolate.server import definitions, health
 from isolate.server.health_server import HealthServicer
 from isolate.server.interface import from_grpc, to_serialized_object
 from isolate.server.server import (
     BridgeManager,
+    GRPCException,
     IsolateServicer,
+    MessageQueue,
+    RunTask,
     ServerBoundInterceptor,
     SingleTaskInterceptor,
+    new_bridge_thread_pool,
 )
 
 REPO_DIR = Path(__file__).parent.parent
@@ -46,12 +55,15 @@ def interceptors():
 
 @contextmanager
 def make_server(
-    tmp_path: Path, interceptors: Optional[List[ServerBoundInterceptor]] = None
+    tmp_path: Path,
+    interceptors: Optional[List[ServerBoundInterceptor]] = None,
+    num_workers: int = 1,
+    options: Optional[List[Any]] = None,
 ) -> Iterator[Stubs]:
     interceptors = interceptors or []
     server = grpc.server(
-        futures.ThreadPoolExecutor(max_workers=1),
-        options=get_default_options(),
+        futures.ThreadPoolExecutor(max_workers=num_workers),
+        options=get_default_options() if options is None else options,
         interceptors=interceptors,  # type: ignore
     )
 
@@ -60,7 +72,11 @@ def make_server(
 
     test_settings = IsolateSettings(cache_dir=tmp_path / "cache")
     with BridgeManager() as bridge:
-        servicer = IsolateServicer(bridge, test_settings)
+        servicer = IsolateServicer(
+            bridge,
+            test_settings,
+            bridge_thread_pool=new_bridge_thread_pool(num_workers),
+        )
 
         for interceptor in interceptors:
             interceptor.register_servicer(servicer)
@@ -313,6 +329,35 @@ def test_no_stream_logs(stub: definitions.IsolateStub, monkeypatch: Any) -> None
     assert len(bridge_logs) == 0
 
 
+def print_debug_lines():
+    print("[debug] a user debug line")
+    print("a regular user line")
+
+
+def test_min_stream_log_level(stub: definitions.IsolateStub, monkeypatch: Any) -> None:
+    inherit_from_local(monkeypatch)
+    request = prepare_request(print_debug_lines)
+
+    # By default every log is streamed, including the bridge's own trace logs.
+    bridge_logs: List[Log] = []
+    run_request(stub, request, bridge_logs=bridge_logs)
+    assert any(log.level < LogLevel.INFO for log in bridge_logs)
+
+    monkeypatch.setattr("isolate.server.server.MIN_STREAM_LOG_LEVEL", LogLevel.INFO)
+
+    user_logs: List[Log] = []
+    bridge_logs = []
+    run_request(stub, request, user_logs=user_logs, bridge_logs=bridge_logs)
+
+    assert all(log.level >= LogLevel.INFO for log in bridge_logs)
+
+    # User logs are never filtered, even when their level is below the minimum.
+    assert [(log.message, log.level) for log in user_logs if log.message] == [
+        ("[debug] a user debug line", LogLevel.DEBUG),
+        ("a regular user line", LogLevel.INFO),
+    ]
+
+
 def test_unknown_environment(stub: definitions.IsolateStub, monkeypatch: Any) -> None:
     inherit_from_local(monkeypatch)
 
@@ -510,6 +555,85 @@ def test_bridge_connection_reuse(
     assert fourth_process_pid == third_process_pid
 
 
+def test_setup_func_cache_key(stub: definitions.IsolateStub, monkeypatch: Any) -> None:
+    inherit_from_local(monkeypatch)
+
+    env = define_environment(
+        "virtualenv",
+        requirements=["pyjokes==0.6.0"],
+    )
+
+    def make_request(setup_result: str) -> definitions.BoundFunction:
+        setup_func = to_serialized_object(
+            lambda: setup_result,
+            method="cloudpickle",
+        )
+        setup_func.cache_key = "setup-key"
+        return definitions.BoundFunction(
+            setup_func=setup_func,
+            function=to_serialized_object(lambda result: result, method="cloudpickle"),
+            environments=[env],
+        )
+
+    assert from_grpc(run_request(stub, make_request("first"))) == "first"
+
+    # Even though the definition is different, the setup function is not
+    # executed again since the cache key is the same.
+    assert from_grpc(run_request(stub, make_request("second"))) == "first"
+
+
+def test_setup_func_failure_is_cached(
+    stub: definitions.IsolateStub, monkeypatch: Any, tmp_path: Path
+) -> None:
+    inherit_from_local(monkeypatch)
+
+    env = define_environment(
+        "virtualenv",
+        requirements=["pyjokes==0.6.0"],
+    )
+    calls_file = str(tmp_path / "setup_calls")
+
+    def failing_setup():
+        with open(calls_file, "a") as stream:
+            stream.write("call\n")
+        raise ValueError("setup failed")
+
+    request = definitions.BoundFunction(
+        setup_func=to_serialized_object(failing_setup, method="cloudpickle"),
+        function=to_serialized_object(lambda result: result, method="cloudpickle"),
+        environments=[env],
+    )
+
+    for _ in range(2):
+        with pytest.raises(grpc.RpcError) as exc:
+            run_request(stub, request)
+        assert cast(grpc.Call, exc.value).code() == grpc.StatusCode.INVALID_ARGUMENT
+
+    # The second run fails without executing the setup function again.
+    with open(calls_file) as stream:
+        assert stream.read().splitlines() == ["call"]
+
+
+def test_setup_func_failures_expire(monkeypatch: Any) -> None:
+    import time
+
+    from isolate.connections.grpc.agent import AgentServicer
+
+    monkeypatch.setattr("isolate.connections.grpc.agent.SETUP_FAILURE_CACHE_TTL", 0.1)
+
+    servicer = AgentServicer()
+    failure = definitions.PartialRunResult(is_complete=True)
+    for num in range(10):
+        servicer._remember_setup_failure(f"setup-{num}", failure)
+    assert servicer._get_setup_failure("setup-0") is failure
+
+    # Expired failures are forgotten as soon as a new one is remembered, even
+    # if they are never looked up again.
+    time.sleep(0.2)
+    servicer._remember_setup_failure("setup-new", failure)
+    assert list(servicer._setup_failures) == ["setup-new"]
+
+
 @pytest.mark.flaky(max_runs=3)
 def test_bridge_connection_reuse_logs(
     stub: definitions.IsolateStub, monkeypatch: Any
@@ -568,6 +692,162 @@ def test_receive_complete_logs(
     assert logs == [str(i) for i in range(num_lines)]
 
 
+def test_queued_logs_are_batched(monkeypatch: Any) -> None:
+    monkeypatch.setattr("isolate.server.server.MAX_LOG_BATCH_SIZE", 3)
+
+    def make_log(message: str) -> definitions.Log:
+        return definitions.Log(message=message, source=definitions.USER)
+
+    queue: MessageQueue = MessageQueue()
+    for message in ["a", "b", "c", "d"]:
+        queue.put_nowait(make_log(message))
+    queue.put_nowait(definitions.PartialRunResult(is_complete=True))
+    queue.put_nowait(make_log("e"))
+
+    future: futures.Future = futures.Future()
+    future.set_result(None)
+
+    servicer = IsolateServicer(BridgeManager())
+    results = list(servicer.watch_queue_until_completed(queue, future))
+    assert [[log.message for log in result.logs] for result in results] == [
+        ["a", "b", "c"],
+        ["d"],
+        [],
+        ["e"],
+    ]
+    assert [result.is_complete for result in results] == [False, False, True, False]
+
+
+def test_message_queue() -> None:
+    queue: MessageQueue = MessageQueue()
+    assert queue.empty()
+    with pytest.raises(QueueEmpty):
+        queue.get_nowait()
+    with pytest.raises(QueueEmpty):
+        queue.get(timeout=0.01)
+
+    timer = threading.Timer(0.1, queue.put_nowait, args=("a",))
+    timer.start()
+    assert queue.get(timeout=5) == "a"
+    timer.join()
+
+    for item in ["b", "c"]:
+        queue.put_nowait(item)
+    assert not queue.empty()
+    assert queue.get_nowait() == "b"
+    assert queue.get(timeout=0) == "c"
+    assert queue.empty()
+
+
+def test_keepalive_messages_while_idle(monkeypatch: Any) -> None:
+    monkeypatch.setattr("isolate.server.server.EMPTY_MESSAGE_INTERVAL", 0.01)
+
+    queue: MessageQueue = MessageQueue()
+    future: futures.Future = futures.Future()
+    timer = threading.Timer(0.2, future.set_result, args=(None,))
+    timer.start()
+
+    servicer = IsolateServicer(BridgeManager())
+    results = list(servicer.watch_queue_until_completed(queue, future))
+    timer.join()
+
+    assert results
+    assert all(not result.is_complete and not result.logs for result in results)
+
+
+def test_task_cancel_is_bounded(monkeypatch: Any) -> None:
+    monkeypatch.setattr("isolate.server.server.MAX_CANCEL_WAIT", 0.1)
+
+    class StuckAgent:
+        terminations = 0
+
+        def terminate(self) -> None:
+            self.terminations += 1
+
+    # A task that can't be canceled (since it is already running) and never
+    # finishes, even after its agent is terminated.
+    future: futures.Future = futures.Future()
+    assert future.set_running_or_notify_cancel()
+
+    agent = StuckAgent()
+    task = RunTask(definitions.BoundFunction(), future=future, agent=cast(Any, agent))
+    task.cancel()
+    assert agent.terminations == 1
+    assert not future.done()
+
+    # Tasks that are not yet started are simply canceled.
+    pending_future: futures.Future = futures.Future()
+    pending_task = RunTask(definitions.BoundFunction(), future=pending_future)
+    pending_task.cancel()
+    assert pending_future.cancelled()
+
+    # Tasks without a future (e.g. the ones from Run) still get their
+    # agent terminated.
+    agent = StuckAgent()
+    run_task = RunTask(definitions.BoundFunction(), agent=cast(Any, agent))
+    run_task.cancel()
+    assert agent.terminations == 1
+
+
+def test_canceled_task_does_not_start_an_agent(
+    tmp_path: Path, monkeypatch: Any
+) -> None:
+    inherit_from_local(monkeypatch)
+
+    def establish(*args: Any, **kwargs: Any) -> Any:
+        raise AssertionError("No agent should be started for a canceled task")
+
+    servicer = IsolateServicer(
+        BridgeManager(), IsolateSettings(cache_dir=tmp_path / "cache")
+    )
+    monkeypatch.setattr(servicer.bridge_manager, "establish", establish)
+
+    task = RunTask(request=prepare_request(myserver))
+    task.cancel()
+
+    with pytest.raises(GRPCException) as exc_info:
+        list(servicer._run_task(task))
+
+    assert cast(GRPCException, exc_info.value).code == grpc.StatusCode.CANCELLED
+
+
+def wait_for_other_runs(rendezvous_dir: str, run_id: int, num_runs: int) -> bool:
+    import os
+    import time
+
+    with open(os.path.join(rendezvous_dir, str(run_id)), "w"):
+        pass
+
+    # Wait until all the runs are executing at the same time.
+    deadline = time.monotonic() + 30
+    while len(os.listdir(rendezvous_dir)) < num_runs:
+        if time.monotonic() > deadline:
+            return False
+        time.sleep(0.05)
+    return True
+
+
+def test_concurrent_runs_over_max_threads(tmp_path: Path, monkeypatch: Any) -> None:
+    inherit_from_local(monkeypatch)
+    monkeypatch.setattr("isolate.server.server.MAX_THREADS", 1)
+    monkeypatch.setattr("isolate.server.server.MAX_RUNNER_THREADS", 1)
+
+    # Each run holds a bridge thread until its function returns, so all of
+    # them can only finish if none of them has to wait for a free thread.
+    num_runs = 3
+    rendezvous_dir = tmp_path / "rendezvous"
+    rendezvous_dir.mkdir()
+    requests = [
+        prepare_request(wait_for_other_runs, str(rendezvous_dir), run_id, num_runs)
+        for run_id in range(num_runs)
+    ]
+
+    with make_server(tmp_path, num_workers=num_runs) as stubs:
+        with futures.ThreadPoolExecutor(max_workers=num_runs) as pool:
+            results = pool.map(partial(run_request, stubs.isolate_stub), requests)
+            assert all(from_grpc(result) for result in results)
+
+
 def take_buffer(buffer):
     return buffer
 
@@ -591,6 +871,46 @@ def test_grpc_option_configuration(tmp_path, monkeypatch):
             assert result == b"0" * 200
 
 
+@pytest.mark.parametrize(
+    "compression, algorithm",
+    [
+        ("gzip", grpc.Compression.Gzip),
+        ("deflate", grpc.Compression.Deflate),
+        ("none", grpc.Compression.NoCompression),
+    ],
+)
+def test_grpc_compression(tmp_path, monkeypatch, compression, algorithm):
+    inherit_from_local(monkeypatch)
+    monkeypatch.setenv("ISOLATE_GRPC_COMPRESSION", compression)
+
+    # Only the isolate server compresses its messages, the channels between
+    # the server and its agents are left alone.
+    server_options = get_default_server_options()
+    option = "grpc.default_compression_algorithm"
+    assert dict(server_options)[option] == algorithm.value
+    assert option not in dict(get_default_options())
+
+    with make_server(tmp_path, options=server_options) as stubs:
+        result, _ = run_function(stubs.isolate_stub, take_buffer, b"0" * 200)
+        assert result == b"0" * 200
+
+
+def test_grpc_compression_unknown(monkeypatch):
+    monkeypatch.setenv("ISOLATE_GRPC_COMPRESSION", "brotli")
+
+    with pytest.raises(ValueError, match="Unknown gRPC compression"):
+        get_default_server_options()
+
+
+def test_grpc_server_option_defaults(monkeypatch):
+    monkeypatch.setenv("ISOLATE_GRPC_CALL_KEEPALIVE_TIME_MS", "5000")
+
+    options = dict(get_default_server_options())
+    assert options["grpc.keepalive_time_ms"] == 5000
+    assert options["grpc.keepalive_permit_without_calls"] == 1
+    assert len(options) == len(get_default_server_options())
+
+
 def test_health_check(health_stub: health.HealthStub) -> None:
     resp: health.HealthCheckResponse = health_stub.Check(
         health.HealthCheckRequest(service="")
@@ -650,6 +970,20 @@ def test_bridge_caching_when_undeerlying_channel_fails(
     # and the bridge is not reused
     os.kill(pid_4, 9)
 
+    # The signal is delivered asynchronously, so wait until the agent has
+    # actually exited (without reaping it, since that is up to the server).
+    deadline = time.monotonic() + 5
+    while True:
+        try:
+            if os.waitid(os.P_PID, pid_4, os.WEXITED | os.WNOHANG | os.WNOWAIT):
+                break
+        except ChildProcessError:
+            # Already reaped by the server.
+            break
+
+        assert time.monotonic() < deadline, "The agent did not exit in time"
+        time.sleep(0.01)
+
     # And channels are kept fresh for a while (according
     # to gRPC spec they might fall into idle when there is
     # no exchange between client and server for a while but